@@ -0,0 +1,117 @@
+"""
+PhishGuard - Request Micro-Batcher
+Coalesces concurrent /predict calls into a single model.predict_proba call.
+"""
+
+import asyncio
+import logging
+from typing import List, Optional, Tuple, Dict, Any
+
+from fastapi.concurrency import run_in_threadpool
+
+from predictor import PhishGuardPredictor
+
+logger = logging.getLogger(__name__)
+
+
+class BatchingPredictor:
+    """
+    Wraps a PhishGuardPredictor so that feature vectors submitted within a short
+    window (``max_wait_ms``) are scored together, up to ``max_batch`` at a time.
+    Feature extraction and SHAP still run per request in the threadpool.
+    """
+
+    def __init__(self, predictor: PhishGuardPredictor, max_batch: int = 32, max_wait_ms: float = 10):
+        self.predictor = predictor
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Requests taken off the queue but not yet answered (being collected or scored)
+        self._batch: List[Tuple[list, asyncio.Future]] = []
+
+    def start(self):
+        """Start the batching loop on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop and fail any requests still waiting on it."""
+        # Clear _task first so requests still in prepare() stop enqueueing
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        pending = [future for _, future in self._batch]
+        self._batch = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait()[1])
+        for future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Predictor is shutting down"))
+
+    async def predict(
+        self,
+        url: str,
+        include_domain_features: bool = False,
+        vt_api_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Async equivalent of PhishGuardPredictor.predict with batched model calls."""
+        predictor = self.predictor
+        hit = predictor.cached(url, include_domain_features, vt_api_key)
+        if hit is not None:
+            return hit
+
+        if self._task is None or not predictor.is_loaded():
+            return await run_in_threadpool(predictor.predict, url, include_domain_features, vt_api_key)
+
+        prepared = await run_in_threadpool(predictor.prepare, url, include_domain_features, vt_api_key)
+
+        if self._task is None:
+            # stop() ran while we were extracting: nothing will drain the queue now
+            phishing_prob = (await run_in_threadpool(predictor.phishing_probabilities, [prepared["vector"]]))[0]
+            return await run_in_threadpool(predictor.finish, prepared, float(phishing_prob))
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((prepared["vector"], future))
+        phishing_prob = await future
+
+        return await run_in_threadpool(predictor.finish, prepared, phishing_prob)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[list, asyncio.Future]] = [await self._queue.get()]
+            self._batch = batch
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                probs = await run_in_threadpool(
+                    self.predictor.phishing_probabilities, [vector for vector, _ in batch]
+                )
+            except Exception as e:
+                logger.error(f"Batched prediction failed for {len(batch)} URLs: {e}", exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                self._batch = []
+                continue
+
+            for (_, future), prob in zip(batch, probs):
+                if not future.done():
+                    future.set_result(float(prob))
+            self._batch = []
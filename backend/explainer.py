@@ -3,11 +3,16 @@ PhishGuard - SHAP Explainability Engine
 Generates human-readable explanations for phishing predictions using SHAP.
 """
 
+import os
+import shutil
+
 import numpy as np
-import pandas as pd
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Union
 import shap
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 # ─── Human-readable feature descriptions ─────────────────────────────────────
 
 FEATURE_DESCRIPTIONS = {
@@ -68,125 +73,274 @@ PHISHING_THRESHOLD_RULES = {
 
 # ─── SHAP Explainer ───────────────────────────────────────────────────────────
 
+def _phishing_class_values(shap_values) -> np.ndarray:
+    """Reduce any SHAP output layout to a (B, F) matrix for the phishing class."""
+    if isinstance(shap_values, list):
+        return np.asarray(shap_values[1] if len(shap_values) > 1 else shap_values[0])
+    shap_values = np.asarray(shap_values)
+    if shap_values.ndim == 3:
+        return shap_values[:, :, 1]
+    return shap_values
+
+
+_IMPACT_LABELS = np.array(["low", "medium", "high"], dtype=object)
+_IMPACT_EDGES = [0.05, 0.1]
+
+
+def _impact_labels(abs_shap: np.ndarray) -> np.ndarray:
+    """Bucket |SHAP| values: > 0.1 high, > 0.05 medium, else low (any shape)."""
+    return _IMPACT_LABELS[np.digitize(abs_shap, _IMPACT_EDGES, right=True)]
+
+
+def _has_cuda() -> bool:
+    """Cheap CUDA probe: a visible device and the NVIDIA driver tooling on PATH."""
+    if os.environ.get("CUDA_VISIBLE_DEVICES", "0").strip() in ("", "-1"):
+        return False
+    return shutil.which("nvidia-smi") is not None
+
+
+def _tree_explainer(clf):
+    """
+    Pick the fastest available TreeSHAP backend:
+    GPUTreeExplainer on CUDA hosts, FastTreeSHAP when installed, else shap.TreeExplainer.
+    Each candidate is probed with a one-row call so a broken backend is skipped.
+    """
+    candidates = []
+    if _has_cuda() and hasattr(shap, "GPUTreeExplainer"):
+        candidates.append(lambda: shap.GPUTreeExplainer(clf))
+    try:
+        import fasttreeshap
+        candidates.append(lambda: fasttreeshap.TreeExplainer(clf, algorithm="auto", n_jobs=-1, shortcut=False))
+    except ImportError:
+        pass
+
+    n_features = getattr(clf, "n_features_in_", None)
+    for build in candidates:
+        try:
+            explainer = build()
+            if n_features:
+                explainer.shap_values(np.zeros((1, n_features)))
+            return explainer
+        except Exception:
+            continue
+
+    return shap.TreeExplainer(clf)
+
+
 class PhishGuardExplainer:
     def __init__(self, model, feature_names: List[str]):
         self.model = model
         self.feature_names = feature_names
         self._explainer = None
         self._background_data = None
+        # Extra shap_values() arguments for the chosen backend
+        self._sv_kwargs: Dict[str, Any] = {}
+        # Replaced by a layout-specific slice once the explainer is probed
+        self._extract_sv = _phishing_class_values
+        # Pipeline scaler resolved once rather than per explain call
+        self._scaler = model.named_steps.get('scaler') if hasattr(model, 'named_steps') else None
+        self._feat_arr = np.asarray(self.feature_names, dtype=object)
+        # (phishing_text, legit_text) aligned with feature_names; "" when undescribed
+        self._desc = [FEATURE_DESCRIPTIONS.get(f, ("", "")) for f in self.feature_names]
+        # Threshold rules bound to column positions, in rule order
+        self._rule_indices = [
+            (self.feature_names.index(feat), feat, fn)
+            for feat, fn in PHISHING_THRESHOLD_RULES.items()
+            if feat in self.feature_names
+        ]
 
     def initialize(self, background_data: Optional[np.ndarray] = None):
         """Initialize SHAP explainer with optional background data."""
         try:
             if background_data is not None:
-                self._background_data = background_data
+                # float32 halves the background matrix footprint
+                self._background_data = np.asarray(background_data, dtype=np.float32)
                 # Use TreeExplainer for tree-based models
                 if hasattr(self._get_classifier(), 'feature_importances_'):
-                    self._explainer = shap.TreeExplainer(self._get_classifier())
+                    self._explainer = _tree_explainer(self._get_classifier())
                 else:
                     self._explainer = shap.LinearExplainer(
                         self._get_classifier(),
-                        background_data
+                        self._background_data
                     )
             else:
                 # Fallback: TreeExplainer for XGBoost/RF
                 clf = self._get_classifier()
                 if hasattr(clf, 'feature_importances_'):
-                    self._explainer = shap.TreeExplainer(clf)
+                    self._explainer = _tree_explainer(clf)
+
+            if self._explainer is not None:
+                if not isinstance(self._explainer, shap.LinearExplainer):
+                    # TreeSHAP's additivity check re-runs the model on every call
+                    self._sv_kwargs = {"check_additivity": False}
+                self._resolve_output_layout()
         except Exception as e:
             self._explainer = None
 
+    def _resolve_output_layout(self):
+        """Probe shap_values once and fix how the (B, F) phishing-class slice is taken."""
+        probe = self._explainer.shap_values(
+            np.zeros((1, len(self.feature_names)), dtype=np.float32), **self._sv_kwargs
+        )
+        if isinstance(probe, list) and len(probe) > 1:
+            self._extract_sv = lambda sv: np.asarray(sv[1])
+        elif isinstance(probe, np.ndarray) and probe.ndim == 3:
+            self._extract_sv = lambda sv: sv[:, :, 1]
+        elif isinstance(probe, np.ndarray) and probe.ndim == 2:
+            self._extract_sv = lambda sv: sv
+
     def _get_classifier(self):
         """Extract actual classifier from pipeline if needed."""
         if hasattr(self.model, 'named_steps'):
             return self.model.named_steps.get('clf', self.model)
         return self.model
 
-    def explain(self, features: pd.DataFrame) -> List[Dict[str, Any]]:
+    def explain(self, features: Union[np.ndarray, "pd.DataFrame"]) -> List[Dict[str, Any]]:
         """
         Generate SHAP-based explanations for a single prediction.
+        Accepts a (F,) / (1, F) array or a one-row DataFrame.
         Returns list of contributing factors sorted by impact.
         """
-        explanations = []
+        X = np.asarray(features).reshape(1, -1)
 
         if self._explainer is not None:
             try:
                 # Transform through pipeline scaler if present
-                if hasattr(self.model, 'named_steps') and 'scaler' in self.model.named_steps:
-                    X_transformed = self.model.named_steps['scaler'].transform(features)
-                else:
-                    X_transformed = features.values
+                X_transformed = self._scaler.transform(X) if self._scaler is not None else X
 
-                shap_values = self._explainer.shap_values(X_transformed)
+                shap_values = self._explainer.shap_values(X_transformed, **self._sv_kwargs)
 
                 # For binary classification, use phishing class (index 1)
-                if isinstance(shap_values, list) and len(shap_values) > 1:
-                    sv = shap_values[1][0]
-                elif isinstance(shap_values, np.ndarray) and shap_values.ndim == 2:
-                    sv = shap_values[0]
-                else:
-                    sv = shap_values[0] if isinstance(shap_values, list) else shap_values
+                sv = self._extract_sv(shap_values)[0]
+                vals = X[0]
+                absv = np.abs(sv)
 
-                for i, (feat, val) in enumerate(zip(self.feature_names, features.iloc[0])):
-                    shap_val = float(sv[i]) if i < len(sv) else 0.0
-                    explanations.append({
-                        "feature": feat,
-                        "value": float(val),
-                        "shap_value": shap_val,
-                        "impact": "high" if abs(shap_val) > 0.1 else "medium" if abs(shap_val) > 0.05 else "low",
-                        "direction": "phishing" if shap_val > 0 else "legitimate",
-                    })
+                # Partial top-10 selection, then order only those 10
+                k = min(10, absv.size)
+                top = np.argpartition(-absv, k - 1)[:k]
+                top = top[np.argsort(-absv[top], kind="stable")]
+                impact = _impact_labels(absv[top])
 
-                explanations.sort(key=lambda x: abs(x["shap_value"]), reverse=True)
-                return explanations[:10]
+                return [
+                    {
+                        "feature": self._feat_arr[i],
+                        "feature_idx": int(i),
+                        "value": float(vals[i]),
+                        "shap_value": float(sv[i]),
+                        "impact": impact[pos],
+                        "direction": "phishing" if sv[i] > 0 else "legitimate",
+                    }
+                    for pos, i in enumerate(top)
+                ]
 
             except Exception:
                 pass
 
         # Fallback: rule-based explanations
-        return self._rule_based_explain(features)
+        return self._rule_based_explain(X)
 
-    def _rule_based_explain(self, features: pd.DataFrame) -> List[Dict[str, Any]]:
+    def explain_batch(self, features: np.ndarray, top_k: int = 10) -> List[List[Dict[str, Any]]]:
+        """
+        Generate SHAP-based explanations for a (B, F) matrix in one SHAP call.
+        Returns one list of contributing factors per row, sorted by impact.
+        """
+        X = np.asarray(features, dtype=float)
+
+        if self._explainer is not None:
+            try:
+                X_transformed = self._scaler.transform(X) if self._scaler is not None else X
+
+                sv = self._extract_sv(self._explainer.shap_values(X_transformed, **self._sv_kwargs))
+                abs_sv = np.abs(sv)
+
+                k = min(top_k, sv.shape[1])
+                top = np.argpartition(-abs_sv, k - 1, axis=1)[:, :k]
+                order = np.argsort(-np.take_along_axis(abs_sv, top, axis=1), axis=1, kind="stable")
+                top = np.take_along_axis(top, order, axis=1)
+
+                top_sv = np.take_along_axis(sv, top, axis=1)
+                top_abs = np.abs(top_sv)
+                top_vals = np.take_along_axis(X, top, axis=1)
+                impact = _impact_labels(top_abs)
+                direction = np.where(top_sv > 0, "phishing", "legitimate")
+
+                return [
+                    [
+                        {
+                            "feature": self.feature_names[j],
+                            "feature_idx": int(j),
+                            "value": float(val),
+                            "shap_value": float(s),
+                            "impact": imp,
+                            "direction": str(d),
+                        }
+                        for j, val, s, imp, d in zip(top[r], top_vals[r], top_sv[r], impact[r], direction[r])
+                    ]
+                    for r in range(X.shape[0])
+                ]
+
+            except Exception:
+                pass
+
+        return [self._rule_based_explain(X[r:r + 1]) for r in range(X.shape[0])]
+
+    def _rule_based_explain(self, features) -> List[Dict[str, Any]]:
         """Fallback rule-based explanation when SHAP fails."""
         explanations = []
-        row = features.iloc[0]
-
-        for feat, threshold_fn in PHISHING_THRESHOLD_RULES.items():
-            if feat in row.index:
-                val = row[feat]
-                triggered = threshold_fn(val)
-                if triggered:
-                    explanations.append({
-                        "feature": feat,
-                        "value": float(val),
-                        "shap_value": 0.2,  # placeholder for display
-                        "impact": "high",
-                        "direction": "phishing",
-                    })
+        row = np.asarray(features)[0]
+
+        for idx, feat, threshold_fn in self._rule_indices:
+            val = row[idx]
+            if threshold_fn(val):
+                explanations.append({
+                    "feature": feat,
+                    "feature_idx": idx,
+                    "value": float(val),
+                    "shap_value": 0.2,  # placeholder for display
+                    "impact": "high",
+                    "direction": "phishing",
+                })
 
         return explanations[:10]
 
-    def get_human_readable_explanations(self, shap_explanations: List[Dict]) -> List[str]:
-        """Convert SHAP explanations to human-readable strings."""
+    def get_human_readable_explanations(
+        self, shap_explanations: List[Dict], limit: Optional[int] = None
+    ) -> List[str]:
+        """Convert SHAP explanations to unique human-readable strings, at most ``limit``."""
         readable = []
+        seen = set()
         for exp in shap_explanations:
-            feat = exp["feature"]
-            val = exp["value"]
-            direction = exp["direction"]
-
-            if feat in FEATURE_DESCRIPTIONS:
-                desc_phishing, desc_legit = FEATURE_DESCRIPTIONS[feat]
-                if direction == "phishing":
-                    readable.append(desc_phishing)
-                else:
-                    readable.append(desc_legit)
+            text = self._desc[exp["feature_idx"]][exp["direction"] != "phishing"]
+            if text and text not in seen:
+                seen.add(text)
+                readable.append(text)
+                if len(readable) == limit:
+                    break
+        return readable
 
-        # Deduplicate while preserving order
-        seen = set()
-        result = []
-        for item in readable:
-            if item not in seen:
-                seen.add(item)
-                result.append(item)
 
-        return result
+# ─── Shared explainer cache ───────────────────────────────────────────────────
+
+_EXPLAINER_CACHE: Dict[int, PhishGuardExplainer] = {}
+
+
+def get_explainer(
+    model,
+    feature_names: List[str],
+    background_data: Optional[np.ndarray] = None,
+) -> PhishGuardExplainer:
+    """
+    Return a warmed-up explainer for ``model``, building it at most once per process.
+    The first explain() call pays SHAP's lazy setup, so it is run here on a zero row.
+    """
+    key = id(model)
+    cached = _EXPLAINER_CACHE.get(key)
+    if cached is not None and cached.model is model:
+        return cached
+
+    explainer = PhishGuardExplainer(model, feature_names)
+    explainer.initialize(background_data)
+    explainer.explain(np.zeros((1, len(feature_names)), dtype=np.float32))
+
+    _EXPLAINER_CACHE[key] = explainer
+    return explainer
@@ -3,15 +3,36 @@ PhishGuard - Feature Extraction Engine
 Extracts lexical and domain-based features from URLs for ML classification.
 """
 
+import os
 import re
 import math
+import asyncio
 import ssl
 import socket
+import hashlib
+import functools
+import threading
 import urllib.parse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Any, Optional, Tuple, Callable, Sequence
 
+import numpy as np
+import requests
+import ahocorasick
 import tldextract
+from diskcache import Cache
+from requests.adapters import HTTPAdapter
+
+try:
+    import hyperscan
+except ImportError:  # wheels are Linux/macOS x86-64 only; Aho-Corasick covers the rest
+    hyperscan = None
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # ─── Suspicious keyword lists ────────────────────────────────────────────────
 SUSPICIOUS_KEYWORDS = [
@@ -39,48 +60,234 @@ SUSPICIOUS_TLDS = {
     'gq', 'pw', 'cc', 'info', 'biz', 'cn', 'ru',
 }
 
+# ─── Precompiled parsers ──────────────────────────────────────────────────────
+
+_SCHEME_RE = re.compile(r'^https?://', re.IGNORECASE)
+_IPV4_RE = re.compile(r'^(\d{1,3}\.){3}\d{1,3}$')
+
+# Bundled public-suffix snapshot: no network fetch or disk-cache probing at runtime
+_TLD = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+# ─── Multi-pattern matcher ────────────────────────────────────────────────────
+# One Aho-Corasick automaton over every keyword and brand; each token maps to
+# the set of categories it belongs to ("paypal" is both a keyword and a
+# brand), so a single pass over the URL yields every hit. Shorteners are
+# whole hostnames and are checked by exact set membership instead.
+
+_KEYWORD, _BRAND = "keyword", "brand"
+
+_BRAND_SET = frozenset(BRAND_NAMES)
+_SHORTENER_SET = frozenset(SHORTENER_DOMAINS)
+
+
+def _build_pattern_automaton() -> "ahocorasick.Automaton":
+    categories: Dict[str, set] = {}
+    for category, tokens in (
+        (_KEYWORD, SUSPICIOUS_KEYWORDS),
+        (_BRAND, BRAND_NAMES),
+    ):
+        for token in tokens:
+            categories.setdefault(token, set()).add(category)
+
+    automaton = ahocorasick.Automaton()
+    for token, cats in categories.items():
+        automaton.add_word(token, (token, frozenset(cats)))
+    automaton.make_automaton()
+    return automaton
+
+
+_PATTERN_AUTOMATON = _build_pattern_automaton()
+
+
+def _build_hyperscan_database():
+    """Compile the same token set into a SIMD Hyperscan block-mode database."""
+    if hyperscan is None:
+        return None, ()
+    payloads = [payload for _, payload in _PATTERN_AUTOMATON.items()]
+    db = hyperscan.Database()
+    db.compile(
+        expressions=[re.escape(token).encode() for token, _ in payloads],
+        ids=list(range(len(payloads))),
+        elements=len(payloads),
+        flags=[hyperscan.HS_FLAG_CASELESS] * len(payloads),
+    )
+    return db, tuple(payloads)
+
 
+_HS_DATABASE, _HS_PAYLOADS = _build_hyperscan_database()
+_hs_local = threading.local()
+
+
+def _pattern_hits(url_lower: str):
+    """
+    Yield (end_index, (token, categories)) for every token occurrence.
+    Hyperscan reports byte offsets, so it is only used for ASCII input.
+    """
+    if _HS_DATABASE is None or not url_lower.isascii():
+        return _PATTERN_AUTOMATON.iter(url_lower)
+
+    scratch = getattr(_hs_local, "scratch", None)
+    if scratch is None:
+        scratch = _hs_local.scratch = hyperscan.Scratch(_HS_DATABASE)
+
+    hits = []
+    _HS_DATABASE.scan(
+        url_lower.encode(),
+        match_event_handler=lambda id_, start, end, flags, ctx: hits.append((end - 1, _HS_PAYLOADS[id_])),
+        scratch=scratch,
+    )
+    return hits
+
+
+@functools.lru_cache(maxsize=50_000)
 def normalize_url(url: str) -> str:
     url = url.strip()
-    if not re.match(r'^https?://', url, re.IGNORECASE):
+    if not _SCHEME_RE.match(url):
         url = 'http://' + url
     return urllib.parse.unquote(url)
 
 
+@functools.lru_cache(maxsize=16384)
 def _string_entropy(s: str) -> float:
     if not s:
         return 0.0
-    prob = [float(s.count(c)) / len(s) for c in set(s)]
-    return -sum(p * math.log2(p) for p in prob)
+    n = len(s)
+    # One Counter pass builds the histogram; str.count per distinct char is O(N*U)
+    return -sum(c / n * math.log2(c / n) for c in Counter(s).values())
+
+
+def _registered_domain(domain_info: tldextract.tldextract.ExtractResult) -> str:
+    """domain.suffix, or '' — ExtractResult.registered_domain warns on every access in tldextract 5.3+."""
+    if domain_info.domain and domain_info.suffix:
+        return f"{domain_info.domain}.{domain_info.suffix}"
+    return ''
+
+
+# Characters urllib.parse.urlsplit removes before parsing
+_URLPARSE_STRIPPED = str.maketrans('', '', '\t\r\n')
+
+
+def _component_spans(
+    url_lower: str, parsed: urllib.parse.ParseResult, subdomain: str
+) -> Tuple[int, int, int, int]:
+    """Return [start, end) offsets of the subdomain and path within ``url_lower`` (\t\r\n removed)."""
+    netloc = parsed.netloc.lower()
+    if netloc:
+        netloc_start = url_lower.find('//') + 2
+        host_start = netloc_start + netloc.rfind('@') + 1
+        netloc_end = netloc_start + len(netloc)
+    else:
+        host_start = netloc_end = 0
+
+    sub_end = host_start + len(subdomain.translate(_URLPARSE_STRIPPED))
+
+    path = parsed.path.lower()
+    path_start = url_lower.find(path, netloc_end) if path else -1
+    if path_start < 0:
+        path_start = path_end = 0
+    else:
+        path_end = path_start + len(path)
+
+    return host_start, sub_end, path_start, path_end
+
+
+@functools.lru_cache(maxsize=16384)
+def _parse(url: str) -> Tuple[urllib.parse.ParseResult, tldextract.tldextract.ExtractResult]:
+    """urlparse + tldextract for an already-normalized URL, shared by every extractor."""
+    return urllib.parse.urlparse(url), _TLD(url)
 
 
 def extract_lexical_features(url: str) -> Dict[str, Any]:
-    parsed = urllib.parse.urlparse(url)
-    domain_info = tldextract.extract(url)
+    return dict(zip(LEXICAL_FEATURE_NAMES, extract_lexical_values(url)))
+
+
+def extract_lexical_values(url: str) -> Tuple[float, ...]:
+    """Lexical features as a tuple in LEXICAL_FEATURE_NAMES order."""
+    return _extract(*_parse(url), url)
+
+
+def extract_lexical_array(url: str) -> np.ndarray:
+    """Lexical features as a float32 vector in LEXICAL_FEATURE_NAMES order."""
+    return np.array(_extract(*_parse(url), url), dtype=np.float32)
+
+
+def _extract(
+    parsed: urllib.parse.ParseResult,
+    domain_info: tldextract.tldextract.ExtractResult,
+    url: str,
+) -> Tuple[float, ...]:
+    (url_length, dot_count, hyphen_count, at_count, question_mark_count, and_count,
+     equal_count, underscore_count, slash_count, percent_count, has_at_symbol,
+     digit_ratio) = _char_features(url)
+    (domain_length, path_length, has_ip_address, has_https, has_double_slash_redirect,
+     has_hyphen_in_domain, subdomain_count, suspicious_keyword_count,
+     has_suspicious_keyword, brand_in_subdomain, brand_in_path, is_suspicious_tld,
+     domain_entropy, hostname_dot_count, has_punycode,
+     is_url_shortened) = _structural_features(parsed, domain_info, url)
+
+    # Positional, in LEXICAL_FEATURE_NAMES order
+    return (
+        url_length, domain_length, path_length, dot_count, hyphen_count, at_count,
+        question_mark_count, and_count, equal_count, underscore_count, slash_count,
+        percent_count, has_ip_address, has_https, has_at_symbol,
+        has_double_slash_redirect, has_hyphen_in_domain, subdomain_count,
+        suspicious_keyword_count, has_suspicious_keyword, brand_in_subdomain,
+        brand_in_path, is_suspicious_tld, domain_entropy, digit_ratio,
+        hostname_dot_count, has_punycode, is_url_shortened,
+    )
+
+
+# Character-count features, which need no URL parsing
+_COUNTED_CHARS = (
+    ("dot_count", "."), ("hyphen_count", "-"), ("at_count", "@"),
+    ("question_mark_count", "?"), ("and_count", "&"), ("equal_count", "="),
+    ("underscore_count", "_"), ("slash_count", "/"), ("percent_count", "%"),
+)
+_COUNTED_CHAR_VALUES = tuple(ch for _, ch in _COUNTED_CHARS)
+_AT_INDEX = _COUNTED_CHAR_VALUES.index("@")
+_DIGIT_RE = re.compile(r'[0-9]+')
+_CHAR_FEATURE_NAMES = (
+    ("url_length",) + tuple(name for name, _ in _COUNTED_CHARS) + ("has_at_symbol", "digit_ratio")
+)
+_STRUCTURAL_FEATURE_NAMES = (
+    "domain_length", "path_length", "has_ip_address", "has_https",
+    "has_double_slash_redirect", "has_hyphen_in_domain", "subdomain_count",
+    "suspicious_keyword_count", "has_suspicious_keyword", "brand_in_subdomain",
+    "brand_in_path", "is_suspicious_tld", "domain_entropy", "hostname_dot_count",
+    "has_punycode", "is_url_shortened",
+)
+
+
+def _char_features(url: str) -> Tuple[float, ...]:
+    """Positional, in _CHAR_FEATURE_NAMES order."""
+    url_length = len(url)
+
+    # Nine str.count sweeps (C loops) plus one regex pass for digits. A single
+    # np.bincount histogram was tried and measured slower for URL-sized strings
+    # (~3.5-4.2us vs ~2.2us): the encode/frombuffer/bincount setup dominates.
+    char_counts = tuple(map(url.count, _COUNTED_CHAR_VALUES))
+    has_at_symbol = int(char_counts[_AT_INDEX] > 0)
+    digit_count = url_length - len(_DIGIT_RE.sub('', url))
+    digit_ratio = round(digit_count / max(url_length, 1), 4)
 
+    return (url_length,) + char_counts + (has_at_symbol, digit_ratio)
+
+
+def _structural_features(
+    parsed: urllib.parse.ParseResult,
+    domain_info: tldextract.tldextract.ExtractResult,
+    url: str,
+) -> Tuple[float, ...]:
+    """Positional, in _STRUCTURAL_FEATURE_NAMES order."""
     hostname = parsed.netloc or ''
     path = parsed.path or ''
 
-    url_length = len(url)
     domain_length = len(domain_info.domain)
     path_length = len(path)
 
-    dot_count = url.count('.')
-    hyphen_count = url.count('-')
-    at_count = url.count('@')
-    question_mark_count = url.count('?')
-    and_count = url.count('&')
-    equal_count = url.count('=')
-    underscore_count = url.count('_')
-    slash_count = url.count('/')
-    percent_count = url.count('%')
-
-    has_ip_address = int(bool(re.match(
-        r'^(\d{1,3}\.){3}\d{1,3}$', hostname.split(':')[0]
-    )))
+    has_ip_address = int(bool(_IPV4_RE.match(hostname.split(':')[0])))
 
     has_https = int(parsed.scheme.lower() == 'https')
-    has_at_symbol = int('@' in url)
     has_double_slash_redirect = int('//' in path)
     has_hyphen_in_domain = int('-' in domain_info.domain)
 
@@ -88,72 +295,136 @@ def extract_lexical_features(url: str) -> Dict[str, Any]:
     subdomain_count = len(subdomain.split('.')) if subdomain else 0
 
     url_lower = url.lower()
-    suspicious_keyword_count = sum(1 for kw in SUSPICIOUS_KEYWORDS if kw in url_lower)
+    # urlparse drops \t\r\n (which normalize_url unquotes from %09/%0A/%0D), so
+    # component offsets only line up with the string it actually parsed
+    parsed_lower = url_lower.translate(_URLPARSE_STRIPPED)
+    if len(parsed_lower) == len(url_lower):
+        parsed_lower = url_lower
+    sub_start, sub_end, path_start, path_end = _component_spans(parsed_lower, parsed, subdomain)
+
+    # An exact label match settles the common case; the automaton still
+    # catches brands embedded inside a label ("paypal-secure")
+    brand_in_subdomain = int(not _BRAND_SET.isdisjoint(subdomain.lower().split('.')))
+    brand_in_path = 0
+
+    keywords_found = set()
+    brand_hits = []
+    for end, (token, categories) in _pattern_hits(url_lower):
+        if _KEYWORD in categories:
+            keywords_found.add(token)
+        if _BRAND in categories:
+            brand_hits.append((end, token))
+    if parsed_lower is not url_lower:
+        # Brands split by a stripped control char ("pay%0Apal") only match here
+        brand_hits = [
+            (end, token) for end, (token, categories) in _pattern_hits(parsed_lower)
+            if _BRAND in categories
+        ]
+
+    for end, token in brand_hits:
+        start = end - len(token) + 1
+        if not brand_in_subdomain and sub_start <= start and end < sub_end:
+            brand_in_subdomain = 1
+        if path_start <= start and end < path_end:
+            brand_in_path = 1
+
+    suspicious_keyword_count = len(keywords_found)
     has_suspicious_keyword = int(suspicious_keyword_count > 0)
 
-    brand_in_subdomain = int(any(b in subdomain.lower() for b in BRAND_NAMES))
-    brand_in_path = int(any(b in path.lower() for b in BRAND_NAMES))
-
     tld = domain_info.suffix.lower() if domain_info.suffix else ''
     is_suspicious_tld = int(tld in SUSPICIOUS_TLDS)
 
     domain_entropy = round(_string_entropy(domain_info.domain), 4)
-    digit_count = sum(c.isdigit() for c in url)
-    digit_ratio = round(digit_count / max(url_length, 1), 4)
     hostname_dot_count = hostname.count('.')
 
-    has_punycode = int('xn--' in url.lower())
-    is_url_shortened = int(any(s in url_lower for s in SHORTENER_DOMAINS))
-
-    return {
-        "url_length": url_length,
-        "domain_length": domain_length,
-        "path_length": path_length,
-        "dot_count": dot_count,
-        "hyphen_count": hyphen_count,
-        "at_count": at_count,
-        "question_mark_count": question_mark_count,
-        "and_count": and_count,
-        "equal_count": equal_count,
-        "underscore_count": underscore_count,
-        "slash_count": slash_count,
-        "percent_count": percent_count,
-        "has_ip_address": has_ip_address,
-        "has_https": has_https,
-        "has_at_symbol": has_at_symbol,
-        "has_double_slash_redirect": has_double_slash_redirect,
-        "has_hyphen_in_domain": has_hyphen_in_domain,
-        "subdomain_count": subdomain_count,
-        "suspicious_keyword_count": suspicious_keyword_count,
-        "has_suspicious_keyword": has_suspicious_keyword,
-        "brand_in_subdomain": brand_in_subdomain,
-        "brand_in_path": brand_in_path,
-        "is_suspicious_tld": is_suspicious_tld,
-        "domain_entropy": domain_entropy,
-        "digit_ratio": digit_ratio,
-        "hostname_dot_count": hostname_dot_count,
-        "has_punycode": has_punycode,
-        "is_url_shortened": is_url_shortened,
-    }
-
-
-def extract_domain_features(url: str, timeout: int = 5) -> Dict[str, Any]:
-    """Extract WHOIS and SSL-based domain features (slower — requires network)."""
-    domain_info = tldextract.extract(url)
-    registered_domain = domain_info.registered_domain
-
+    has_punycode = int('xn--' in url_lower)
+    is_url_shortened = int(
+        (parsed.hostname or '') in _SHORTENER_SET
+        or _registered_domain(domain_info).lower() in _SHORTENER_SET
+    )
+
+    return (
+        domain_length, path_length, has_ip_address, has_https,
+        has_double_slash_redirect, has_hyphen_in_domain, subdomain_count,
+        suspicious_keyword_count, has_suspicious_keyword, brand_in_subdomain,
+        brand_in_path, is_suspicious_tld, domain_entropy, hostname_dot_count,
+        has_punycode, is_url_shortened,
+    )
+
+
+def batch_extract_lexical(urls: Sequence[str]) -> "pd.DataFrame":
+    """
+    Lexical features for many (normalized) URLs as a DataFrame in
+    LEXICAL_FEATURE_NAMES column order. Character counts run as pandas string
+    kernels over the whole column; only the parse-dependent features loop per
+    URL. Rows whose URL fails to parse are all zeros.
+    """
+    import pandas as pd
+
+    s = pd.Series(list(urls), dtype="string").fillna("")
+    lengths = s.str.len().astype("int64")
+
+    chars = {"url_length": lengths}
+    for name, ch in _COUNTED_CHARS:
+        chars[name] = s.str.count(re.escape(ch)).astype("int64")
+    chars["has_at_symbol"] = (chars["at_count"] > 0).astype("int64")
+    digit_counts = s.str.count("[0-9]").astype("int64")
+    chars["digit_ratio"] = [
+        round(d / max(n, 1), 4) for d, n in zip(digit_counts.tolist(), lengths.tolist())
+    ]
+
+    structural, failed = [], []
+    zeros = (0,) * len(_STRUCTURAL_FEATURE_NAMES)
+    for i, url in enumerate(s.tolist()):
+        try:
+            structural.append(_structural_features(urllib.parse.urlparse(url), _TLD(url), url))
+        except Exception:
+            structural.append(zeros)
+            failed.append(i)
+
+    df = pd.concat(
+        [pd.DataFrame(chars), pd.DataFrame(structural, columns=list(_STRUCTURAL_FEATURE_NAMES))],
+        axis=1,
+    )[LEXICAL_FEATURE_NAMES]
+    if failed:
+        df.iloc[failed] = 0
+    return df
+
+
+# ─── Network lookup caches ────────────────────────────────────────────────────
+# WHOIS and certificate data change on day/month timescales, VirusTotal
+# verdicts on hour timescales. Disk-backed so every worker process shares them.
+
+WHOIS_CACHE_TTL = 24 * 3600
+SSL_CACHE_TTL = 24 * 3600
+VT_CACHE_TTL = 3600
+
+
+@functools.lru_cache(maxsize=None)
+def _lookup_cache(name: str) -> Cache:
+    root = os.getenv("PHISHGUARD_CACHE_DIR", str(Path(__file__).parent / ".cache"))
+    return Cache(os.path.join(root, name))
+
+
+def _cached(cache: Cache, key: str, ttl: int, fn: Callable[..., Any], *args) -> Any:
+    value = cache.get(key)
+    if value is not None:
+        return value
+    value = fn(*args)
+    if value is not None:
+        cache.set(key, value, expire=ttl)
+    return value
+
+
+def _whois_features(registered_domain: str) -> Optional[Dict[str, Any]]:
+    """WHOIS-derived features, or None when the lookup failed (so it is not cached)."""
     features = {
         "domain_age_days": -1,
         "domain_expiry_days": -1,
-        "has_ssl_certificate": 0,
-        "ssl_age_days": -1,
         "registrar_known": 0,
         "domain_registered": 0,
     }
 
-    if not registered_domain:
-        return features
-
     try:
         import whois
         w = whois.whois(registered_domain)
@@ -176,44 +447,152 @@ def extract_domain_features(url: str, timeout: int = 5) -> Dict[str, Any]:
         if w.registrar:
             features["registrar_known"] = 1
     except Exception:
-        pass
+        # Rate limits, timeouts and "no match" all land here; don't pin any of
+        # them in the cache as "not registered"
+        return None
+
+    return features
+
+
+# Shared TLS context (CA bundle loaded once); dead hosts fail on the short
+# connect timeout instead of the full handshake timeout
+_SSL_CTX = ssl.create_default_context()
+SSL_CONNECT_TIMEOUT = 1.5
+
+
+@functools.lru_cache(maxsize=4096)
+def _cert_time_to_seconds(cert_time: str) -> float:
+    return ssl.cert_time_to_seconds(cert_time)
+
+
+def _ssl_features(registered_domain: str, timeout: int) -> Optional[Dict[str, Any]]:
+    """
+    Certificate features, or None when the host could not be reached (so a
+    transient failure is not cached). An invalid certificate is a real answer.
+    """
+    features = {"has_ssl_certificate": 0, "ssl_age_days": -1}
 
     try:
-        ctx = ssl.create_default_context()
-        with socket.create_connection((registered_domain, 443), timeout=timeout) as sock:
-            with ctx.wrap_socket(sock, server_hostname=registered_domain) as ssock:
+        connect_timeout = min(timeout, SSL_CONNECT_TIMEOUT)
+        with socket.create_connection((registered_domain, 443), timeout=connect_timeout) as sock:
+            sock.settimeout(timeout)
+            with _SSL_CTX.wrap_socket(sock, server_hostname=registered_domain) as ssock:
                 cert = ssock.getpeercert()
                 features["has_ssl_certificate"] = 1
-                not_before = ssl.cert_time_to_seconds(cert['notBefore'])
+                not_before = _cert_time_to_seconds(cert['notBefore'])
                 cert_age = (datetime.now().timestamp() - not_before) / 86400
                 features["ssl_age_days"] = int(cert_age)
-    except Exception:
+    except ssl.SSLCertVerificationError:
         pass
+    except Exception:
+        return None
 
     return features
 
 
+def extract_domain_features(url: str, timeout: int = 5) -> Dict[str, Any]:
+    """Extract WHOIS and SSL-based domain features (slower — requires network)."""
+    _, domain_info = _parse(url)
+    registered_domain = _registered_domain(domain_info)
+
+    features = {
+        "domain_age_days": -1,
+        "domain_expiry_days": -1,
+        "has_ssl_certificate": 0,
+        "ssl_age_days": -1,
+        "registrar_known": 0,
+        "domain_registered": 0,
+    }
+
+    if not registered_domain:
+        return features
+
+    # WHOIS and the TLS handshake are independent round-trips — overlap them
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        whois_future = ex.submit(
+            _cached, _lookup_cache("whois"), registered_domain, WHOIS_CACHE_TTL,
+            _whois_features, registered_domain,
+        )
+        ssl_future = ex.submit(
+            _cached, _lookup_cache("ssl"), registered_domain, SSL_CACHE_TTL,
+            _ssl_features, registered_domain, timeout,
+        )
+        # Failed lookups (None) leave the defaults above in place
+        features.update(whois_future.result() or {})
+        features.update(ssl_future.result() or {})
+
+    return features
+
+
+async def extract_domain_features_async(url: str, timeout: int = 5) -> Dict[str, Any]:
+    """Awaitable extract_domain_features, for asyncio.gather fan-out over many URLs."""
+    return await asyncio.to_thread(extract_domain_features, url, timeout)
+
+
+_VT_URL = "https://www.virustotal.com/api/v3/urls"
+_VT_UNAVAILABLE = {"vt_malicious_count": 0, "vt_suspicious_count": 0, "vt_available": 0}
+
+# Pooled keep-alive session: repeat VT calls skip the TCP + TLS handshake
+_VT_SESSION = requests.Session()
+_VT_SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=1))
+
+
+def _vt_url_id(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def _vt_stats(payload: Dict[str, Any]) -> Dict[str, Any]:
+    stats = payload['data']['attributes']['last_analysis_stats']
+    return {
+        "vt_malicious_count": stats.get('malicious', 0),
+        "vt_suspicious_count": stats.get('suspicious', 0),
+        "vt_available": 1,
+    }
+
+
+def _virustotal_lookup(url_id: str, api_key: str) -> Optional[Dict[str, Any]]:
+    try:
+        resp = _VT_SESSION.get(f"{_VT_URL}/{url_id}", headers={"x-apikey": api_key}, timeout=10)
+        if resp.status_code == 200:
+            return _vt_stats(resp.json())
+    except Exception:
+        pass
+    return None
+
+
 def query_virustotal(url: str, api_key: Optional[str] = None) -> Dict[str, Any]:
     if not api_key:
-        return {"vt_malicious_count": 0, "vt_suspicious_count": 0, "vt_available": 0}
+        return dict(_VT_UNAVAILABLE)
+    url_id = _vt_url_id(url)
+    # Failed lookups return None and are not cached
+    result = _cached(_lookup_cache("virustotal"), url_id, VT_CACHE_TTL, _virustotal_lookup, url_id, api_key)
+    return result or dict(_VT_UNAVAILABLE)
+
+
+async def query_virustotal_async(url: str, api_key: Optional[str], client) -> Dict[str, Any]:
+    """
+    Async VirusTotal lookup over a caller-owned client, e.g. a shared
+    ``httpx.AsyncClient(http2=True)``, so a batch can multiplex N lookups
+    over one connection with asyncio.gather.
+    """
+    if not api_key:
+        return dict(_VT_UNAVAILABLE)
+    url_id = _vt_url_id(url)
+    cache = _lookup_cache("virustotal")
+    # diskcache is synchronous SQLite (and may wait on other workers' locks),
+    # so keep it off the event loop
+    cached = await asyncio.to_thread(cache.get, url_id)
+    if cached is not None:
+        return cached
     try:
-        import hashlib
-        import requests
-        url_id = hashlib.sha256(url.encode()).hexdigest()
-        resp = requests.get(
-            f"https://www.virustotal.com/api/v3/urls/{url_id}",
-            headers={"x-apikey": api_key}, timeout=10
-        )
+        resp = await client.get(f"{_VT_URL}/{url_id}", headers={"x-apikey": api_key}, timeout=10)
         if resp.status_code == 200:
-            stats = resp.json()['data']['attributes']['last_analysis_stats']
-            return {
-                "vt_malicious_count": stats.get('malicious', 0),
-                "vt_suspicious_count": stats.get('suspicious', 0),
-                "vt_available": 1,
-            }
+            result = _vt_stats(resp.json())
+            await asyncio.to_thread(cache.set, url_id, result, expire=VT_CACHE_TTL)
+            return result
     except Exception:
         pass
-    return {"vt_malicious_count": 0, "vt_suspicious_count": 0, "vt_available": 0}
+    return dict(_VT_UNAVAILABLE)
 
 
 def extract_all_features(
@@ -222,8 +601,8 @@ def extract_all_features(
     vt_api_key: Optional[str] = None
 ) -> Dict[str, Any]:
     normalized = normalize_url(url)
-    features = {}
-    features.update(extract_lexical_features(normalized))
+    features = dict(_lexical_features_cached(normalized))
+    # Network features go through the TTL caches rather than the in-process LRU
     if include_domain:
         features.update(extract_domain_features(normalized))
     if vt_api_key:
@@ -231,6 +610,11 @@ def extract_all_features(
     return features
 
 
+@functools.lru_cache(maxsize=4096)
+def _lexical_features_cached(normalized: str) -> Dict[str, Any]:
+    return extract_lexical_features(normalized)
+
+
 # ─── Ordered feature name lists ────────────────────────────────────────────
 
 LEXICAL_FEATURE_NAMES = [
@@ -251,3 +635,6 @@ DOMAIN_FEATURE_NAMES = [
 ]
 
 ALL_FEATURE_NAMES = LEXICAL_FEATURE_NAMES + DOMAIN_FEATURE_NAMES
+
+# The only non-integer features; everything else is a count, flag or day count
+FLOAT_FEATURE_NAMES = ("domain_entropy", "digit_ratio")
@@ -0,0 +1,38 @@
+"""
+PhishGuard - Gunicorn Config
+Production server: N uvicorn workers (uvloop + httptools).
+
+Usage:
+    gunicorn -c gunicorn_conf.py main:app
+"""
+
+import gc
+import os
+import multiprocessing
+
+# One BLAS/OpenMP thread per worker so XGBoost/numpy in N workers don't fight
+# over the same cores; the N workers already use every core, so each extracts
+# batch features in-process rather than through its own process pool.
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("EXTRACT_WORKERS", "1")
+
+bind         = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+workers      = int(os.getenv("WORKERS", str(2 * multiprocessing.cpu_count() + 1)))
+worker_class = "uvicorn.workers.UvicornWorker"
+loglevel     = os.getenv("LOG_LEVEL", "warning")
+accesslog    = None
+timeout      = 60
+keepalive    = 5
+
+# Unpickle the model once in the master; forked workers share its pages
+# copy-on-write. ONNX sessions and SHAP explainers are still built per worker.
+preload_model = os.getenv("PRELOAD_MODEL", "1") == "1"
+
+
+def on_starting(server):
+    if not preload_model:
+        return
+    from predictor import preload_artifact
+    if preload_artifact():
+        # Keep the collector from touching (and so copying) the preloaded objects
+        gc.freeze()
@@ -5,24 +5,32 @@ Real-Time Phishing Detection API
 
 import os
 import io
+import secrets
+import codecs
+import sys
+import re
 import csv
+import itertools
 import time
 import logging
 import urllib.parse
-from typing import Optional, List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Iterator, BinaryIO, Annotated
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Request, UploadFile, File
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+import orjson
 import uvicorn
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
 
-from predictor import get_predictor
+from predictor import get_predictor, init_extract_worker
+from feature_extractor import extract_lexical_features, normalize_url
+from batcher import BatchingPredictor
+from rate_limiter import rate_limit
 
 # ─── Environment Config ────────────────────────────────────────────────────────
 
@@ -35,6 +43,11 @@ except ImportError:
 ALLOWED_ORIGINS  = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 MAX_UPLOAD_URLS  = int(os.getenv("MAX_UPLOAD_URLS",  "500"))
 MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))  # 5 MB
+MAX_URL_LENGTH   = 2000
+BATCH_MAX        = int(os.getenv("BATCH_MAX",        "32"))
+BATCH_WAIT_MS    = float(os.getenv("BATCH_WAIT_MS",  "10"))
+EXTRACT_WORKERS  = int(os.getenv("EXTRACT_WORKERS",  str(os.cpu_count() or 1)))
+ADMIN_TOKEN      = os.getenv("PHISHGUARD_ADMIN_TOKEN", "")  # unset: admin routes disabled
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
@@ -42,32 +55,72 @@ logger = logging.getLogger(__name__)
 
 # ─── Upload File Parser ────────────────────────────────────────────────────────
 
-def _parse_upload(raw: bytes, filename: str) -> List[str]:
-    """Extract URLs from uploaded .txt or .csv content."""
-    text = raw.decode("utf-8", errors="replace")
-    ext  = (filename or "").rsplit(".", 1)[-1].lower()
+# A bare "\r" ends a CSV record too; "\r\n" stays together (the binary line
+# iterator already split after "\n")
+_BARE_CR = re.compile(r'(?<=\r)(?!\n)')
+
+
+def _check_url_length(url: str) -> str:
+    # Same cap as PredictRequest; keeps huge lines out of the normalize/parse/result caches
+    if len(url) > MAX_URL_LENGTH:
+        raise ValueError(f"URL exceeds {MAX_URL_LENGTH} characters: {url[:50]}...")
+    return url
+
+
+def _iter_upload_urls(fp: BinaryIO, ext: str) -> Iterator[str]:
+    """Stream URLs out of an uploaded .txt or .csv file object."""
+    # Decode the binary line iterator rather than wrapping fp in a TextIOWrapper:
+    # SpooledTemporaryFile only gained the needed IOBase methods in Python 3.11
+    chunks = codecs.iterdecode(fp, "utf-8", errors="replace")
 
     if ext == "csv":
-        reader    = csv.DictReader(io.StringIO(text))
+        # csv needs records split on "\r"/"\n" only (newline=""); str.splitlines
+        # would also break quoted fields on "\x0c", "\x85", "\u2028", ...
+        records   = (rec for chunk in chunks for rec in _BARE_CR.split(chunk) if rec)
+        reader    = csv.DictReader(records)
         fields    = reader.fieldnames or []
         url_field = next(
             (f for f in fields if "url" in f.lower()),
             fields[0] if fields else None,
         )
-        urls = []
+        if url_field is None:
+            return
         for row in reader:
-            val = row.get(url_field, "").strip() if url_field else ""
+            val = (row.get(url_field) or "").strip()
             if val:
-                urls.append(val)
-        return urls
+                yield _check_url_length(val)
+        return
 
     # Plain text: one URL per line
-    return [line.strip() for line in text.splitlines() if line.strip()]
+    for line in (line for chunk in chunks for line in chunk.splitlines()):
+        line = line.strip()
+        if line:
+            yield _check_url_length(line)
+
+
+def _parse_upload(fp: BinaryIO, ext: str) -> List[str]:
+    """
+    Collect unique URLs from an upload, preserving order. Stops once more than
+    MAX_UPLOAD_URLS unique URLs have been seen.
+    """
+    urls    = _iter_upload_urls(fp, ext)
+    deduped = {}  # insertion-ordered set
+    while len(deduped) <= MAX_UPLOAD_URLS:
+        # Never pull more lines than could still fit, so we stop at MAX + 1
+        chunk = list(itertools.islice(urls, MAX_UPLOAD_URLS + 1 - len(deduped)))
+        if not chunk:
+            break
+        deduped.update(dict.fromkeys(chunk))
+    return list(deduped)
+
 
+# ─── JSON Responses ───────────────────────────────────────────────────────────
 
-# ─── Rate Limiter ─────────────────────────────────────────────────────────────
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (numpy scalars/arrays serialize natively)."""
 
-limiter = Limiter(key_func=get_remote_address, default_limits=["100/minute"])
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
 
 
 # ─── Lifespan ─────────────────────────────────────────────────────────────────
@@ -75,10 +128,25 @@ limiter = Limiter(key_func=get_remote_address, default_limits=["100/minute"])
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("PhishGuard API starting — loading predictor...")
-    get_predictor()  # Warm up
+    predictor = get_predictor()  # Warm up
+    app.state.batcher = BatchingPredictor(predictor, BATCH_MAX, BATCH_WAIT_MS)
+    app.state.batcher.start()
+    # Worker processes for batch/upload feature extraction, spun up before traffic.
+    # Warming the parent first means forked workers start with tldextract loaded;
+    # the initializer covers spawn-based platforms. With a single extraction
+    # worker (as under gunicorn) IPC to one child only adds overhead, so batches
+    # are extracted in-process instead.
+    init_extract_worker()
+    app.state.pool = None
+    if EXTRACT_WORKERS > 1:
+        app.state.pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, initializer=init_extract_worker)
+        app.state.pool.submit(init_extract_worker).result()
     logger.info("PhishGuard API ready.")
     yield
     logger.info("PhishGuard API shutting down.")
+    await app.state.batcher.stop()
+    if app.state.pool is not None:
+        app.state.pool.shutdown(wait=False, cancel_futures=True)
 
 
 # ─── FastAPI App ──────────────────────────────────────────────────────────────
@@ -90,11 +158,9 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-
 # CORS — controlled via ALLOWED_ORIGINS env var
 app.add_middleware(
     CORSMiddleware,
@@ -115,24 +181,26 @@ if os.path.isdir(frontend_path):
 
 # ─── Request / Response Models ────────────────────────────────────────────────
 
+# Optional http(s) scheme, a non-empty authority, then anything after / ? or #
+# (the lookahead stops a bare "http://" from matching "http:" as the authority)
+_URL_RE = re.compile(
+    r'^(?!https?://(?:[\s/?#]|$))(?:https?://)?[^\s/?#]{1,253}(?:[/?#].*)?$',
+    re.IGNORECASE,
+)
+
+
 class PredictRequest(BaseModel):
-    url: str
+    # Trimming and length limits run in pydantic-core before validate_url
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    url: Annotated[str, Field(min_length=1, max_length=MAX_URL_LENGTH)]
     include_domain_features: bool = False
     vt_api_key: Optional[str] = None
 
-    @validator('url')
-    def validate_url(cls, v):
-        v = v.strip()
-        if not v:
-            raise ValueError("URL cannot be empty")
-        if len(v) > 2000:
-            raise ValueError("URL exceeds maximum length of 2000 characters")
-        test_url = v if v.startswith(('http://', 'https://')) else f'http://{v}'
-        try:
-            result = urllib.parse.urlparse(test_url)
-            if not result.netloc:
-                raise ValueError("Invalid URL format")
-        except Exception:
+    @field_validator('url')
+    @classmethod
+    def validate_url(cls, v: str) -> str:
+        if not _URL_RE.match(v):
             raise ValueError("Invalid URL format")
         return v
 
@@ -162,18 +230,13 @@ class PredictResponse(BaseModel):
     timestamp: str
 
 
+_RESPONSE_FIELDS = frozenset(PredictResponse.model_fields)
+
+
 class BatchPredictRequest(BaseModel):
-    urls: List[str]
+    urls: Annotated[List[Annotated[str, Field(max_length=MAX_URL_LENGTH)]], Field(min_length=1, max_length=50)]
     include_domain_features: bool = False
 
-    @validator('urls')
-    def validate_urls(cls, v):
-        if not v:
-            raise ValueError("URLs list cannot be empty")
-        if len(v) > 50:
-            raise ValueError("Maximum 50 URLs per batch request")
-        return v
-
 
 class HealthResponse(BaseModel):
     status: str
@@ -208,8 +271,8 @@ async def health_check():
     )
 
 
-@app.post("/predict", response_model=PredictResponse, tags=["Detection"])
-@limiter.limit("30/minute")
+@app.post("/predict", response_model=PredictResponse, tags=["Detection"],
+          dependencies=[Depends(rate_limit(30))])
 async def predict_url(request: Request, body: PredictRequest):
     """
     Analyze a URL for phishing indicators.
@@ -221,16 +284,14 @@ async def predict_url(request: Request, body: PredictRequest):
     Returns a prediction with confidence score, risk score, and SHAP explanations.
     """
     try:
-        predictor = get_predictor()
-        result = predictor.predict(
-            url=body.url,
-            include_domain_features=body.include_domain_features,
-            vt_api_key=body.vt_api_key,
+        result = await request.app.state.batcher.predict(
+            body.url,
+            body.include_domain_features,
+            body.vt_api_key,
         )
-        return PredictResponse(**{
-            k: result[k]
-            for k in PredictResponse.__fields__.keys()
-            if k in result
+        # Internal, already well-typed data: skip re-validating on construction
+        return PredictResponse.model_construct(**{
+            k: v for k, v in result.items() if k in _RESPONSE_FIELDS
         })
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
@@ -239,8 +300,7 @@ async def predict_url(request: Request, body: PredictRequest):
         raise HTTPException(status_code=500, detail="Internal prediction error")
 
 
-@app.post("/predict/batch", tags=["Detection"])
-@limiter.limit("10/minute")
+@app.post("/predict/batch", tags=["Detection"], dependencies=[Depends(rate_limit(10))])
 async def predict_batch(request: Request, body: BatchPredictRequest):
     """
     Analyze multiple URLs in a single request (max 50).
@@ -248,10 +308,10 @@ async def predict_batch(request: Request, body: BatchPredictRequest):
     """
     predictor = get_predictor()
     results   = []
+    outcomes  = await run_in_threadpool(predictor.predict_batch, body.urls, request.app.state.pool)
 
-    for url in body.urls:
-        try:
-            result = predictor.predict(url=url, include_domain_features=False)
+    for url, result in zip(body.urls, outcomes):
+        if not isinstance(result, Exception):
             results.append({
                 "url":          url,
                 "prediction":   result["prediction"],
@@ -259,10 +319,10 @@ async def predict_batch(request: Request, body: BatchPredictRequest):
                 "confidence":   result["confidence"],
                 "explanations": result["explanations"][:3],
             })
-        except Exception as e:
+        else:
             results.append({
                 "url":          url,
-                "error":        str(e),
+                "error":        str(result),
                 "prediction":   "error",
                 "risk_score":   -1,
                 "confidence":   0,
@@ -272,8 +332,7 @@ async def predict_batch(request: Request, body: BatchPredictRequest):
     return {"results": results, "count": len(results)}
 
 
-@app.post("/predict/upload", tags=["Detection"])
-@limiter.limit("5/minute")
+@app.post("/predict/upload", tags=["Detection"], dependencies=[Depends(rate_limit(5))])
 async def predict_upload(request: Request, file: UploadFile = File(...)):
     """
     Upload a .txt or .csv file containing URLs (one per line or URL column).
@@ -294,42 +353,41 @@ async def predict_upload(request: Request, file: UploadFile = File(...)):
             detail="Only .txt and .csv files are supported",
         )
 
-    raw = await file.read()
+    # The multipart parser has already spooled the upload (to disk past 1 MB)
+    # and recorded its size, so it is rejected here without being read
+    size = file.size
+    if size is None:
+        file.file.seek(0, io.SEEK_END)
+        size = file.file.tell()
+        file.file.seek(0)
 
-    if len(raw) > MAX_UPLOAD_BYTES:
+    if size > MAX_UPLOAD_BYTES:
         raise HTTPException(
             status_code=413,
             detail=f"File exceeds maximum size of {MAX_UPLOAD_BYTES // (1024*1024)} MB",
         )
 
     try:
-        urls = _parse_upload(raw, filename)
+        deduped = await run_in_threadpool(_parse_upload, file.file, ext)
     except Exception as e:
         raise HTTPException(status_code=422, detail=f"Failed to parse file: {e}")
 
-    if not urls:
+    if not deduped:
         raise HTTPException(status_code=422, detail="No URLs found in file")
 
-    # Deduplicate while preserving order
-    seen, deduped = set(), []
-    for u in urls:
-        if u not in seen:
-            seen.add(u)
-            deduped.append(u)
-
     if len(deduped) > MAX_UPLOAD_URLS:
         raise HTTPException(
             status_code=422,
-            detail=f"File contains {len(deduped)} URLs — maximum is {MAX_UPLOAD_URLS}",
+            detail=f"File contains more than {MAX_UPLOAD_URLS} URLs — maximum is {MAX_UPLOAD_URLS}",
         )
 
     predictor = get_predictor()
     results   = []
     stats     = {"phishing": 0, "suspicious": 0, "legitimate": 0, "error": 0}
+    outcomes  = await run_in_threadpool(predictor.predict_batch, deduped, request.app.state.pool)
 
-    for url in deduped:
-        try:
-            result = predictor.predict(url=url, include_domain_features=False)
+    for url, result in zip(deduped, outcomes):
+        if not isinstance(result, Exception):
             pred   = result["prediction"]
             stats[pred] = stats.get(pred, 0) + 1
             results.append({
@@ -339,7 +397,7 @@ async def predict_upload(request: Request, file: UploadFile = File(...)):
                 "confidence":   result["confidence"],
                 "risk_level":   result["risk_level"],
             })
-        except Exception as e:
+        else:
             stats["error"] += 1
             results.append({
                 "url":        url,
@@ -347,7 +405,7 @@ async def predict_upload(request: Request, file: UploadFile = File(...)):
                 "risk_score": -1,
                 "confidence": 0,
                 "risk_level": "error",
-                "error":      str(e),
+                "error":      str(result),
             })
 
     threat_count = stats["phishing"] + stats["suspicious"]
@@ -361,20 +419,37 @@ async def predict_upload(request: Request, file: UploadFile = File(...)):
     }
 
 
-@app.get("/features/{url:path}", tags=["Detection"])
-@limiter.limit("20/minute")
-async def get_features(request: Request, url: str):
+@app.get("/features/{url:path}", tags=["Detection"], dependencies=[Depends(rate_limit(20))])
+async def get_features(url: str):
     """Get extracted features for a URL without running ML prediction."""
-    from feature_extractor import extract_lexical_features, normalize_url
-
     try:
         normalized = normalize_url(urllib.parse.unquote(url))
-        features   = extract_lexical_features(normalized)
+        features   = await run_in_threadpool(extract_lexical_features, normalized)
         return {"url": url, "normalized_url": normalized, "features": features}
     except Exception as e:
         raise HTTPException(status_code=422, detail=str(e))
 
 
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Reject callers that don't present PHISHGUARD_ADMIN_TOKEN in X-Admin-Token."""
+    if not x_admin_token or not secrets.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+if ADMIN_TOKEN:
+    @app.post("/cache/clear", tags=["System"], dependencies=[Depends(require_admin)])
+    async def clear_cache():
+        """
+        Drop all cached prediction results and SHAP explanations.
+
+        The caches are per process: under gunicorn this clears only the worker
+        that handles the call, so other workers keep serving cached results
+        until they expire (RESULT_CACHE_TTL).
+        """
+        cleared = get_predictor().clear_cache()
+        return {"cleared": cleared}
+
+
 @app.get("/model/info", tags=["System"])
 async def model_info():
     """Get information about the loaded model."""
@@ -410,10 +485,20 @@ async def server_error(request: Request, exc):
 # ─── Entry Point ──────────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
+    reload  = os.getenv("RELOAD", "true").lower() == "true"
+    workers = 1 if reload else int(os.getenv("WORKERS", str(os.cpu_count() or 1)))
+    if workers > 1:
+        # Spawned workers inherit these; see gunicorn_conf.py
+        os.environ.setdefault("OMP_NUM_THREADS", "1")
+        os.environ.setdefault("EXTRACT_WORKERS", "1")
+
     uvicorn.run(
         "main:app",
         host  = os.getenv("HOST",  "0.0.0.0"),
         port  = int(os.getenv("PORT", "8000")),
-        reload= os.getenv("RELOAD", "true").lower() == "true",
-        workers=1,
+        reload= reload,
+        workers=workers,
+        loop  = "asyncio" if sys.platform == "win32" else "uvloop",
+        http  = "httptools",
+        log_level=os.getenv("LOG_LEVEL", "info"),
     )
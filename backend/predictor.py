@@ -4,23 +4,48 @@ Orchestrates feature extraction, ML prediction, SHAP explanation, and risk scori
 """
 
 import os
+import time
+import pickle
+import warnings
 import logging
+import threading
 import numpy as np
-import pandas as pd
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Sequence, List, Tuple, Union
+from concurrent.futures import Executor
 from pathlib import Path
 from datetime import datetime
 
+from cachetools import TTLCache, LRUCache
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
 from feature_extractor import (
-    normalize_url, extract_lexical_features,
-    extract_domain_features, LEXICAL_FEATURE_NAMES
+    normalize_url, extract_lexical_values,
+    extract_domain_features, LEXICAL_FEATURE_NAMES, ALL_FEATURE_NAMES, FLOAT_FEATURE_NAMES
 )
-from explainer import PhishGuardExplainer, FEATURE_DESCRIPTIONS
-from model_trainer import load_model
+from explainer import get_explainer, FEATURE_DESCRIPTIONS, PHISHING_THRESHOLD_RULES
 
 logger = logging.getLogger(__name__)
 
 MODELS_DIR = Path(__file__).parent / "models"
+DEFAULT_MODEL = MODELS_DIR / "phishguard_model.pkl"
+
+# Models fitted on a DataFrame are scored with plain ndarrays on purpose
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "10000"))
+RESULT_CACHE_TTL  = int(os.getenv("RESULT_CACHE_TTL",  "3600"))  # seconds
+SHAP_CACHE_SIZE   = int(os.getenv("SHAP_CACHE_SIZE",   "1024"))
+
+# SHAP only runs for phishing probabilities strictly inside this band; confident
+# predictions get rule-based explanations instead (0 and 1 disable the skip)
+SHAP_MIN_PROB = float(os.getenv("SHAP_MIN_PROB", "0.15"))
+SHAP_MAX_PROB = float(os.getenv("SHAP_MAX_PROB", "0.9"))
+
+MAX_EXPLANATIONS = 6  # human-readable explanations per result
 
 # ─── Labels ───────────────────────────────────────────────────────────────────
 LABEL_MAP = {0: "legitimate", 1: "phishing"}
@@ -31,8 +56,57 @@ CLASS_CONFIDENCE_THRESHOLDS = {
 }
 
 
+# ─── Chart Labels ─────────────────────────────────────────────────────────────
+
+def _feature_label(feat: str) -> str:
+    return feat.replace("_", " ").title()
+
+
+_FEATURE_LABELS = {feat: _feature_label(feat) for feat in ALL_FEATURE_NAMES}
+_NO_DESCRIPTION = ("", "")
+
+
 # ─── Risk Scorer ──────────────────────────────────────────────────────────────
 
+# (feature, default when missing, bonus weight, trigger) — triggers work on
+# scalars and on numpy arrays alike
+RISK_RULES = (
+    ("has_ip_address",         0,  5, lambda v: v != 0),
+    ("has_https",              1,  5, lambda v: v == 0),                 # no HTTPS
+    ("has_at_symbol",          0,  5, lambda v: v != 0),
+    ("brand_in_subdomain",     0,  5, lambda v: v != 0),
+    ("is_url_shortened",       0,  3, lambda v: v != 0),
+    ("has_suspicious_keyword", 0,  3, lambda v: v != 0),
+    ("is_suspicious_tld",      0,  2, lambda v: v != 0),
+    ("has_punycode",           0,  4, lambda v: v != 0),
+    ("domain_age_days",       -1,  4, lambda v: (0 < v) & (v <= 30)),    # new domain
+)
+_RULE_WEIGHTS = np.array([weight for _, _, weight, _ in RISK_RULES], dtype=np.int32)
+
+
+# Checks behind the no-model fallback probability: (feature, default, value
+# contributed to the check sum); same scalar/array duality as RISK_RULES
+FALLBACK_RULES = (
+    ("has_ip_address",         0, lambda v: v),
+    ("has_https",              1, lambda v: 1 - v),
+    ("has_at_symbol",          0, lambda v: v),
+    ("brand_in_subdomain",     0, lambda v: v),
+    ("is_url_shortened",       0, lambda v: v),
+    ("has_suspicious_keyword", 0, lambda v: v),
+    ("is_suspicious_tld",      0, lambda v: v),
+    ("has_punycode",           0, lambda v: v),
+    ("url_length",             0, lambda v: 1 * (v > 75)),
+    ("subdomain_count",        0, lambda v: 1 * (v > 2)),
+)
+
+# Threshold rules paired with their phishing description, for the no-model explanations
+_THRESHOLD_EXPLANATIONS = tuple(
+    (feat, fn, FEATURE_DESCRIPTIONS[feat][0])
+    for feat, fn in PHISHING_THRESHOLD_RULES.items()
+    if feat in FEATURE_DESCRIPTIONS
+)
+
+
 def compute_risk_score(
     phishing_probability: float,
     features: Dict[str, Any],
@@ -48,48 +122,150 @@ def compute_risk_score(
 
     # Rule-based bonus signals
     bonus = 0
-    rule_checks = {
-        "has_ip_address": (features.get("has_ip_address", 0), 5),
-        "no_https": (not features.get("has_https", 1), 5),
-        "has_at_symbol": (features.get("has_at_symbol", 0), 5),
-        "brand_in_subdomain": (features.get("brand_in_subdomain", 0), 5),
-        "is_url_shortened": (features.get("is_url_shortened", 0), 3),
-        "has_suspicious_keyword": (features.get("has_suspicious_keyword", 0), 3),
-        "is_suspicious_tld": (features.get("is_suspicious_tld", 0), 2),
-        "has_punycode": (features.get("has_punycode", 0), 4),
-        "new_domain": (0 < features.get("domain_age_days", -1) <= 30, 4),
-    }
-
-    for _, (triggered, weight) in rule_checks.items():
-        if triggered:
+    for feat, default, weight, triggered in RISK_RULES:
+        if triggered(features.get(feat, default)):
             bonus += weight
 
     total_score = min(100, int(base_score + bonus))
     return total_score
 
 
+def compute_risk_scores(phishing_probabilities: np.ndarray, feature_rows: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """
+    Vectorized compute_risk_score over a batch of URLs: an (N, rules) 0/1
+    trigger matrix times the rule weights gives every bonus in one matmul.
+    (A single URL is cheaper through the plain loop in compute_risk_score.)
+    """
+    triggers = np.empty((len(feature_rows), len(RISK_RULES)), dtype=np.int8)
+    for j, (feat, default, _, triggered) in enumerate(RISK_RULES):
+        triggers[:, j] = triggered(np.array([row.get(feat, default) for row in feature_rows], dtype=float))
+    bonus = triggers @ _RULE_WEIGHTS
+    return np.minimum(100, (np.asarray(phishing_probabilities) * 70 + bonus).astype(int))
+
+
+# Risk levels indexed by (score >= 40) + (score >= 70)
+RISK_LEVELS = ("legitimate", "suspicious", "phishing")
+RISK_COLORS = {"phishing": "#ff2d55", "suspicious": "#ffcc00", "legitimate": "#00ff9f"}
+_RISK_LEVELS_ARR = np.array(RISK_LEVELS)
+
+
+def risk_levels_from_scores(scores: np.ndarray) -> np.ndarray:
+    return _RISK_LEVELS_ARR[(scores >= 40).astype(np.int8) + (scores >= 70)]
+
+
 def risk_level_from_score(score: int) -> str:
-    if score >= 70:
-        return "phishing"
-    elif score >= 40:
-        return "suspicious"
-    else:
-        return "legitimate"
+    return RISK_LEVELS[(score >= 40) + (score >= 70)]
 
 
 def risk_color_from_level(level: str) -> str:
-    return {"phishing": "#ff2d55", "suspicious": "#ffcc00", "legitimate": "#00ff9f"}.get(level, "#888")
+    return RISK_COLORS.get(level, "#888")
+
+
+# ─── Batch Extraction ─────────────────────────────────────────────────────────
+
+EXTRACT_CHUNKSIZE = 8
+
+
+def extract_url_features(url: str) -> Tuple[str, Optional[Tuple[float, ...]], Optional[str]]:
+    """
+    Normalize a URL and extract its lexical feature values (LEXICAL_FEATURE_NAMES
+    order). Module-level and exception-free so it can be mapped over a process pool.
+    Returns (normalized_url, values, error).
+    """
+    try:
+        normalized_url = normalize_url(url)
+        return normalized_url, extract_lexical_values(normalized_url), None
+    except Exception as e:
+        return "", None, str(e) or type(e).__name__
+
+
+def init_extract_worker():
+    """Pool initializer: load tldextract's suffix list before the first real URL."""
+    extract_url_features("http://example.com")
+
+
+# ─── Model Loading ────────────────────────────────────────────────────────────
+
+# Unpickled artifacts by path, with the file mtime they were read at
+_ARTIFACT_CACHE: Dict[Path, Tuple[float, Dict[str, Any]]] = {}
+
+
+def _load_artifact(path: Path) -> Dict[str, Any]:
+    """Unpickle a model artifact written by model_trainer.save_model, reusing an unchanged one."""
+    # Local to the API so serving never imports the training stack (imblearn, skl2onnx)
+    mtime = path.stat().st_mtime
+    cached = _ARTIFACT_CACHE.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, "rb") as f:
+        artifact = pickle.load(f)
+    _ARTIFACT_CACHE[path] = (mtime, artifact)
+    return artifact
+
+
+def preload_artifact(path: Optional[Path] = None) -> bool:
+    """
+    Unpickle the model before worker processes fork (gunicorn master), so every
+    worker's predictor reuses the same copy-on-write pages instead of its own.
+    """
+    path = path or DEFAULT_MODEL
+    if not path.exists():
+        return False
+    _load_artifact(path)
+    return True
+
+
+# ─── ONNX Runtime ─────────────────────────────────────────────────────────────
+
+class _OnnxModel:
+    """predict_proba over an exported ONNX model (see model_trainer.export_onnx)."""
+
+    def __init__(self, path: Path):
+        self.session = ort.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        return self.session.run(["probabilities"], {self.input_name: X})[0]
+
+
+def _load_onnx(model_path: Path) -> Optional[_OnnxModel]:
+    """Load the ONNX twin of a pickled model if it exists and is not stale."""
+    onnx_path = model_path.with_suffix(".onnx")
+    if ort is None or not onnx_path.exists():
+        return None
+    if onnx_path.stat().st_mtime < model_path.stat().st_mtime:
+        logger.warning(f"Ignoring stale ONNX model: {onnx_path}")
+        return None
+    try:
+        return _OnnxModel(onnx_path)
+    except Exception as e:
+        logger.warning(f"Failed to load ONNX model {onnx_path}: {e}")
+        return None
 
 
 # ─── Predictor Class ──────────────────────────────────────────────────────────
 
 class PhishGuardPredictor:
+    shap_min_prob = SHAP_MIN_PROB
+    shap_max_prob = SHAP_MAX_PROB
+
     def __init__(self, model_path: Optional[str] = None):
         self.artifact = None
         self.model = None
+        self.onnx_model = None
         self.feature_names = LEXICAL_FEATURE_NAMES
+        self._feat_index = {name: i for i, name in enumerate(self.feature_names)}
+        self._lexical_model = True  # feature_names == LEXICAL_FEATURE_NAMES
+        self._model_used = "rule-based"  # "model_used" of every result
+        self._local = threading.local()  # per-thread (1, F) input buffer
         self.explainer = None
         self._loaded = False
+        # Finished results keyed on (normalized_url, include_domain_features, vt_lookup)
+        self._result_cache = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+        # SHAP explanations keyed on the feature vector: distinct URLs often share one
+        self._shap_cache = LRUCache(maxsize=SHAP_CACHE_SIZE)
+        self._cache_lock = threading.RLock()
 
         if model_path:
             self.load(model_path)
@@ -97,20 +273,55 @@ class PhishGuardPredictor:
     def load(self, model_path: str):
         """Load a trained model artifact."""
         try:
-            self.artifact = load_model(Path(model_path).name)
+            self.artifact = _load_artifact(MODELS_DIR / Path(model_path).name)
             self.model = self.artifact["model"]
             self.feature_names = self.artifact["feature_names"]
-            self.explainer = PhishGuardExplainer(self.model, self.feature_names)
-            self.explainer.initialize()
+            self._feat_index = {name: i for i, name in enumerate(self.feature_names)}
+            self._lexical_model = list(self.feature_names) == LEXICAL_FEATURE_NAMES
+            # ONNX handles scoring when available; the sklearn model still backs SHAP
+            self.onnx_model = _load_onnx(MODELS_DIR / Path(model_path).name)
+            self.explainer = get_explainer(self.model, self.feature_names)
             self._loaded = True
-            logger.info(f"Model loaded: {self.artifact['metadata'].get('model_name', 'unknown')}")
+            self._model_used = self.artifact["metadata"].get("model_name", "rule-based")
+            self.clear_cache()
+            logger.info(
+                f"Model loaded: {self.artifact['metadata'].get('model_name', 'unknown')}"
+                f"{' (ONNX runtime)' if self.onnx_model else ''}"
+            )
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
             self._loaded = False
+            self._model_used = "rule-based"
 
     def is_loaded(self) -> bool:
         return self._loaded
 
+    def cached(
+        self,
+        url: str,
+        include_domain_features: bool = False,
+        vt_api_key: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Return a cached result for this URL, re-stamped for the current request."""
+        start_ns = time.perf_counter_ns()
+        # Requests with a VirusTotal key get (and fill) their own entries
+        key = (normalize_url(url), include_domain_features, bool(vt_api_key))
+        with self._cache_lock:
+            hit = self._result_cache.get(key)
+        if hit is None:
+            return None
+
+        elapsed_ms = round((time.perf_counter_ns() - start_ns) / 1e6, 1)
+        return {**hit, "url": url, "latency_ms": elapsed_ms, "timestamp": datetime.now().isoformat()}
+
+    def clear_cache(self) -> int:
+        """Drop all cached results and explanations; returns how many results were removed."""
+        with self._cache_lock:
+            count = len(self._result_cache)
+            self._result_cache.clear()
+            self._shap_cache.clear()
+        return count
+
     def predict(
         self,
         url: str,
@@ -121,35 +332,161 @@ class PhishGuardPredictor:
         Full prediction pipeline for a URL.
         Returns structured prediction result.
         """
-        start_time = datetime.now()
+        hit = self.cached(url, include_domain_features, vt_api_key)
+        if hit is not None:
+            return hit
+
+        prepared = self.prepare(url, include_domain_features, vt_api_key)
+
+        # ML prediction
+        if self._loaded and self.model is not None:
+            X = self._row_buffer(prepared["vector"])
+            phishing_prob = float(self.phishing_probabilities(X)[0])
+        else:
+            # Fallback: rule-based scoring
+            phishing_prob = self._rule_based_probability(prepared["features"])
+
+        return self.finish(prepared, phishing_prob)
+
+    def predict_batch(
+        self,
+        urls: Sequence[str],
+        executor: Optional[Executor] = None
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Lexical-only prediction for many URLs. Uncached URLs are extracted
+        (across ``executor`` when given), then scored, risk-ranked and
+        explained as one (N, F) matrix. Each entry is either a result dict or
+        the Exception raised for that URL.
+        """
+        start_ns = time.perf_counter_ns()
+        results: List[Union[Dict[str, Any], Exception, None]] = [self.cached(url) for url in urls]
+        misses = [i for i, hit in enumerate(results) if hit is None]
+        if not misses:
+            return results
+
+        pending = [urls[i] for i in misses]
+        if executor is not None and len(pending) > 1:
+            extracted = executor.map(extract_url_features, pending, chunksize=EXTRACT_CHUNKSIZE)
+        else:
+            extracted = map(extract_url_features, pending)
+
+        prepared = []
+        for i, (normalized_url, values, error) in zip(misses, extracted):
+            if error is not None:
+                results[i] = ValueError(error)
+            else:
+                feats = dict(zip(LEXICAL_FEATURE_NAMES, values))
+                prepared.append((i, self._prepared(urls[i], normalized_url, feats, False, start_ns, values)))
+
+        if not prepared:
+            return results
+
+        feature_rows = [p["features"] for _, p in prepared]
+        # float64 so SHAP reports exact feature values; the model call casts to float32
+        X = np.array([p["vector"] for _, p in prepared], dtype=float)
+        try:
+            if self._loaded and self.model is not None:
+                probs = self.phishing_probabilities(X)
+            else:
+                probs = self._rule_based_probabilities(X)
+
+            risk_scores = compute_risk_scores(probs, feature_rows)
+            risk_levels = risk_levels_from_scores(risk_scores)
+            confidences = np.select(
+                [risk_levels == "phishing", risk_levels == "suspicious"],
+                [np.minimum(probs * 100, 99.9), probs * 100],
+                (1 - probs) * 100,
+            )
+
+            shap_batch = [[] for _ in prepared]
+            if self.explainer:
+                ambiguous = np.flatnonzero((probs > self.shap_min_prob) & (probs < self.shap_max_prob))
+                if ambiguous.size:
+                    for r, explanations in zip(ambiguous, self._explain_batch(X[ambiguous])):
+                        shap_batch[r] = explanations
+        except Exception as e:
+            for i, _ in prepared:
+                results[i] = e
+            return results
+
+        for r, (i, p) in enumerate(prepared):
+            try:
+                results[i] = self._assemble(
+                    p, float(probs[r]), int(risk_scores[r]), str(risk_levels[r]),
+                    round(float(confidences[r]), 1), shap_batch[r],
+                )
+            except Exception as e:
+                results[i] = e
+        return results
+
+    def prepare(
+        self,
+        url: str,
+        include_domain_features: bool = False,
+        vt_api_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Normalize a URL and build its feature vector, without running the model."""
+        start_ns = time.perf_counter_ns()
 
         # Normalize URL
         normalized_url = normalize_url(url)
 
         # Extract features
-        lexical_feats = extract_lexical_features(normalized_url)
+        lexical_values = extract_lexical_values(normalized_url)
+        all_feats = dict(zip(LEXICAL_FEATURE_NAMES, lexical_values))
 
         # Domain features (optional — slower due to WHOIS/SSL)
-        domain_feats = {}
         if include_domain_features:
-            domain_feats = extract_domain_features(normalized_url)
+            all_feats.update(extract_domain_features(normalized_url))
+            lexical_values = None
 
-        all_feats = {**lexical_feats, **domain_feats}
+        prepared = self._prepared(url, normalized_url, all_feats, include_domain_features, start_ns, lexical_values)
+        prepared["vt_lookup"] = bool(vt_api_key)
+        return prepared
 
-        # Build feature vector
-        feature_vector = []
-        for feat_name in self.feature_names:
-            feature_vector.append(all_feats.get(feat_name, 0))
-
-        X = pd.DataFrame([feature_vector], columns=self.feature_names)
-
-        # ML prediction
-        if self._loaded and self.model is not None:
-            proba = self.model.predict_proba(X)[0]
-            phishing_prob = float(proba[1]) if len(proba) > 1 else float(proba[0])
+    def _prepared(
+        self,
+        url: str,
+        normalized_url: str,
+        all_feats: Dict[str, Any],
+        include_domain_features: bool,
+        start_ns: int,
+        lexical_values: Optional[Tuple[float, ...]] = None
+    ) -> Dict[str, Any]:
+        # A lexical-only model takes the extractor's positional values as they are
+        if lexical_values is not None and self._lexical_model:
+            vector = lexical_values
         else:
-            # Fallback: rule-based scoring
-            phishing_prob = self._rule_based_probability(all_feats)
+            vector = [all_feats.get(feat_name, 0) for feat_name in self.feature_names]
+        return {
+            "url": url,
+            "normalized_url": normalized_url,
+            "include_domain_features": include_domain_features,
+            "vt_lookup": False,
+            "features": all_feats,
+            "vector": vector,
+            "start_ns": start_ns,
+        }
+
+    def phishing_probabilities(self, vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        """Phishing probability for each feature vector, from one predict_proba call."""
+        # Plain float32 ndarray in feature_names order; a DataFrame per call costs more than the model
+        X = np.asarray(vectors, dtype=np.float32)
+        proba = (self.onnx_model or self.model).predict_proba(X)
+        return proba[:, 1] if proba.shape[1] > 1 else proba[:, 0]
+
+    def _row_buffer(self, vector: Sequence[float]) -> np.ndarray:
+        """Copy a feature vector into this thread's reusable (1, F) float32 buffer."""
+        buf = getattr(self._local, "buf", None)
+        if buf is None or buf.shape[1] != len(vector):
+            buf = self._local.buf = np.empty((1, len(vector)), dtype=np.float32)
+        buf[0] = vector
+        return buf
+
+    def finish(self, prepared: Dict[str, Any], phishing_prob: float) -> Dict[str, Any]:
+        """Turn a prepared URL and its phishing probability into the API result."""
+        all_feats = prepared["features"]
 
         # Risk score
         risk_score = compute_risk_score(phishing_prob, all_feats, bool(all_feats.get("has_ssl_certificate", 0)))
@@ -163,16 +500,57 @@ class PhishGuardPredictor:
         else:
             confidence = round((1 - phishing_prob) * 100, 1)
 
-        # SHAP Explanations
-        if self.explainer:
-            shap_explanations = self.explainer.explain(X)
-            human_explanations = self.explainer.get_human_readable_explanations(shap_explanations)
+        # SHAP Explanations, for ambiguous predictions only
+        if self.explainer and self.shap_min_prob < phishing_prob < self.shap_max_prob:
+            shap_explanations = self._explain(prepared["vector"])
         else:
             shap_explanations = []
-            human_explanations = self._rule_based_explanations(all_feats)
 
-        # Remove duplicates
-        human_explanations = list(dict.fromkeys(human_explanations))
+        return self._assemble(prepared, phishing_prob, risk_score, risk_level, confidence, shap_explanations)
+
+    def _explain(self, vector: Sequence[float]) -> List[Dict[str, Any]]:
+        """SHAP explanation for one feature vector, memoized on its values."""
+        key = tuple(vector)
+        with self._cache_lock:
+            explanations = self._shap_cache.get(key)
+        if explanations is None:
+            explanations = self.explainer.explain(vector)
+            with self._cache_lock:
+                self._shap_cache[key] = explanations
+        return explanations
+
+    def _explain_batch(self, X: np.ndarray) -> List[List[Dict[str, Any]]]:
+        """Like _explain for each row of X, with one SHAP call for all uncached rows."""
+        keys = [tuple(row) for row in X.tolist()]
+        with self._cache_lock:
+            explanations = [self._shap_cache.get(key) for key in keys]
+
+        missing = [r for r, exps in enumerate(explanations) if exps is None]
+        if missing:
+            fresh = self.explainer.explain_batch(X[missing])
+            with self._cache_lock:
+                for r, exps in zip(missing, fresh):
+                    explanations[r] = self._shap_cache[keys[r]] = exps
+        return explanations
+
+    def _assemble(
+        self,
+        prepared: Dict[str, Any],
+        phishing_prob: float,
+        risk_score: int,
+        risk_level: str,
+        confidence: float,
+        shap_explanations: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Build (and cache) the API result from already-scored pieces."""
+        all_feats = prepared["features"]
+
+        if shap_explanations:
+            human_explanations = self.explainer.get_human_readable_explanations(
+                shap_explanations, limit=MAX_EXPLANATIONS
+            )
+        else:
+            human_explanations = self._rule_based_explanations(all_feats)
 
         # Top SHAP features for radar/bar chart
         top_features = []
@@ -180,57 +558,70 @@ class PhishGuardPredictor:
             feat = exp["feature"]
             top_features.append({
                 "name": feat,
-                "label": feat.replace("_", " ").title(),
+                "label": _FEATURE_LABELS.get(feat) or _feature_label(feat),
                 "value": exp["value"],
                 "shap_value": round(abs(exp["shap_value"]) * 100, 2),
                 "direction": exp["direction"],
-                "description": FEATURE_DESCRIPTIONS.get(feat, ("", ""))[0 if exp["direction"] == "phishing" else 1],
+                "description": FEATURE_DESCRIPTIONS.get(feat, _NO_DESCRIPTION)[exp["direction"] != "phishing"],
             })
 
-        elapsed_ms = round((datetime.now() - start_time).total_seconds() * 1000, 1)
+        elapsed_ms = round((time.perf_counter_ns() - prepared["start_ns"]) / 1e6, 1)
 
-        return {
-            "url": url,
-            "normalized_url": normalized_url,
+        result = {
+            "url": prepared["url"],
+            "normalized_url": prepared["normalized_url"],
             "prediction": risk_level,
             "phishing_probability": round(phishing_prob, 4),
             "confidence": confidence,
             "risk_score": risk_score,
             "risk_level": risk_level,
             "risk_color": risk_color_from_level(risk_level),
-            "explanations": human_explanations[:6],
+            "explanations": human_explanations,
             "top_features": top_features,
-            "features": {k: round(v, 4) if isinstance(v, float) else v for k, v in all_feats.items()},
-            "model_used": self.artifact["metadata"].get("model_name", "rule-based") if self._loaded else "rule-based",
+            "features": self._rounded_features(all_feats),
+            "model_used": self._model_used,
             "latency_ms": elapsed_ms,
-            "timestamp": start_time.isoformat(),
+            "timestamp": datetime.now().isoformat(),
         }
 
+        key = (prepared["normalized_url"], prepared["include_domain_features"], prepared["vt_lookup"])
+        with self._cache_lock:
+            self._result_cache[key] = result
+        return result
+
+    @staticmethod
+    def _rounded_features(all_feats: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of the feature dict with the float features rounded to 4 places."""
+        features = dict(all_feats)
+        for feat in FLOAT_FEATURE_NAMES:
+            if feat in features:
+                features[feat] = round(features[feat], 4)
+        return features
+
     def _rule_based_probability(self, features: Dict) -> float:
         """Estimate phishing probability from rules when no model is loaded."""
-        score = 0
-        checks = [
-            features.get("has_ip_address", 0),
-            1 - features.get("has_https", 1),
-            features.get("has_at_symbol", 0),
-            features.get("brand_in_subdomain", 0),
-            features.get("is_url_shortened", 0),
-            features.get("has_suspicious_keyword", 0),
-            features.get("is_suspicious_tld", 0),
-            features.get("has_punycode", 0),
-            int(features.get("url_length", 0) > 75),
-            int(features.get("subdomain_count", 0) > 2),
-        ]
-        score = sum(checks) / len(checks)
-        return min(score, 0.99)
+        score = sum(check(features.get(feat, default)) for feat, default, check in FALLBACK_RULES)
+        return min(score / len(FALLBACK_RULES), 0.99)
+
+    def _rule_based_probabilities(self, X: np.ndarray) -> np.ndarray:
+        """_rule_based_probability for every row of a feature matrix, column by column."""
+        total = np.zeros(len(X))
+        for feat, default, check in FALLBACK_RULES:
+            i = self._feat_index.get(feat)
+            total += check(X[:, i]) if i is not None else check(default)
+        return np.minimum(total / len(FALLBACK_RULES), 0.99)
 
     def _rule_based_explanations(self, features: Dict) -> list:
-        from explainer import PHISHING_THRESHOLD_RULES, FEATURE_DESCRIPTIONS
+        # One (unique) description per rule, so no dedup is needed. Features that
+        # were not extracted (domain features on lexical-only requests) are skipped
+        # rather than read as 0, which would flag "new domain" and "no SSL".
         explanations = []
-        for feat, fn in PHISHING_THRESHOLD_RULES.items():
-            val = features.get(feat, 0)
-            if fn(val) and feat in FEATURE_DESCRIPTIONS:
-                explanations.append(FEATURE_DESCRIPTIONS[feat][0])
+        for feat, fn, description in _THRESHOLD_EXPLANATIONS:
+            value = features.get(feat)
+            if value is not None and fn(value):
+                explanations.append(description)
+                if len(explanations) == MAX_EXPLANATIONS:
+                    break
         return explanations
 
 
@@ -244,9 +635,8 @@ def get_predictor() -> PhishGuardPredictor:
     if _predictor_instance is None:
         _predictor_instance = PhishGuardPredictor()
         # Try to load default model
-        default_model = MODELS_DIR / "phishguard_model.pkl"
-        if default_model.exists():
-            _predictor_instance.load(str(default_model))
+        if DEFAULT_MODEL.exists():
+            _predictor_instance.load(str(DEFAULT_MODEL))
         else:
             logger.warning("No trained model found. Using rule-based fallback.")
     return _predictor_instance
@@ -0,0 +1,67 @@
+"""
+PhishGuard - Rate Limiter
+In-process token bucket per client IP, exposed as a FastAPI dependency.
+"""
+
+import time
+import threading
+from typing import Dict, Tuple
+
+from fastapi import HTTPException, Request
+
+# Past this many tracked clients, fully refilled buckets are dropped
+MAX_TRACKED_CLIENTS = 10_000
+
+
+class TokenBucket:
+    """
+    ``capacity`` requests per ``period`` seconds for each key, refilled
+    continuously. State is one (last_refill, tokens) pair per key.
+    """
+
+    def __init__(self, capacity: int, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.rate = capacity / period  # tokens per second
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            last, tokens = self._buckets.get(key, (now, self.capacity))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1.0
+            self._buckets[key] = (now, tokens - 1.0 if allowed else tokens)
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._prune(now)
+        return allowed
+
+    def retry_after(self, key: str) -> int:
+        """Whole seconds until ``key`` has a token again."""
+        with self._lock:
+            _, tokens = self._buckets.get(key, (0.0, self.capacity))
+        return max(1, int((1.0 - tokens) / self.rate + 0.999))
+
+    def _prune(self, now: float):
+        # A bucket that has refilled to capacity is indistinguishable from a new one
+        full_after = self.capacity / self.rate
+        self._buckets = {
+            key: state for key, state in self._buckets.items() if now - state[0] < full_after
+        }
+
+
+def rate_limit(times: int, period: float = 60.0):
+    """FastAPI dependency allowing ``times`` requests per ``period`` seconds per client IP."""
+    bucket = TokenBucket(times, period)
+    description = f"{times} per {int(period)} seconds" if period != 60 else f"{times} per 1 minute"
+
+    async def dependency(request: Request):
+        key = request.client.host if request.client else "unknown"
+        if not bucket.allow(key):
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded: {description}",
+                headers={"Retry-After": str(bucket.retry_after(key))},
+            )
+
+    return dependency
@@ -5,6 +5,8 @@ Downloads the UCI/Kaggle phishing URL dataset for training.
 """
 
 import os
+import shutil
+import argparse
 import urllib.request
 import zipfile
 from pathlib import Path
@@ -21,11 +23,40 @@ DATASETS = {
     },
 }
 
+DOWNLOAD_CHUNK = 1 << 20  # 1 MB
+
+
+def download_dataset(name: str) -> Path:
+    """
+    Stream a dataset from DATASETS to DATA_DIR in fixed-size chunks, so peak
+    memory stays at one chunk whatever the file size. Zip archives are
+    extracted member by member the same way.
+    """
+    info = DATASETS[name]
+    dest = DATA_DIR / info["filename"]
+    if not dest.exists():
+        print(f"Downloading {info['note']} ...")
+        tmp = dest.with_name(dest.name + ".part")
+        with urllib.request.urlopen(info["url"], timeout=60) as resp, open(tmp, "wb") as f:
+            shutil.copyfileobj(resp, f, DOWNLOAD_CHUNK)
+        os.replace(tmp, dest)
+
+    if zipfile.is_zipfile(dest):
+        with zipfile.ZipFile(dest) as zf:
+            for member in zf.infolist():
+                if member.is_dir():
+                    continue
+                target = DATA_DIR / Path(member.filename).name
+                with zf.open(member) as src, open(target, "wb") as out:
+                    shutil.copyfileobj(src, out, DOWNLOAD_CHUNK)
+                print(f"  extracted {target}")
+
+    print(f"Dataset ready: {dest}")
+    return dest
+
 
 def create_sample_dataset():
     """Create a small sample CSV dataset for demonstration."""
-    import csv
-
     sample_data = [
         # Phishing examples (label=1)
         ("http://paypa1-secure.verify-account.xyz/login?redirect=paypal.com", 1),
@@ -51,15 +82,14 @@ def create_sample_dataset():
         ("https://www.apple.com/iphone/", 0),
     ]
 
+    # One bulk write; the sample URLs contain no commas or quotes to escape
     csv_path = DATA_DIR / "sample_phishing_urls.csv"
-    with open(csv_path, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['url', 'label'])
-        writer.writerows(sample_data)
+    csv_path.write_text("url,label\n" + "".join(f"{url},{label}\n" for url, label in sample_data))
 
+    phishing = sum(label for _, label in sample_data)
     print(f"Sample dataset created: {csv_path}")
-    print(f"  {sum(1 for _, l in sample_data if l == 1)} phishing samples")
-    print(f"  {sum(1 for _, l in sample_data if l == 0)} legitimate samples")
+    print(f"  {phishing} phishing samples")
+    print(f"  {len(sample_data) - phishing} legitimate samples")
     print()
     print("NOTE: For production training, use a larger dataset:")
     print("  - Phishtank: https://phishtank.org/developer_info.php")
@@ -69,8 +99,16 @@ def create_sample_dataset():
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="PhishGuard Dataset Setup")
+    parser.add_argument("--download", action="store_true", help="Also download the datasets in DATASETS")
+    args = parser.parse_args()
+
     print("PhishGuard Dataset Setup")
     print("=" * 40)
+    if args.download:
+        for name in DATASETS:
+            download_dataset(name)
+        print()
     csv_path = create_sample_dataset()
     print()
     print(f"To train the model with this sample data:")